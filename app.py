@@ -1,90 +1,379 @@
 import asyncio
+import atexit
+import contextlib
+import hashlib
+import importlib.util
+import json
 import platform
+import threading
+import time
+from collections import OrderedDict
 if platform.system() == "Windows":
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+else:
+    try:
+        import uvloop  # faster libuv-based event loop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
 import streamlit as st
 import aiohttp
-from playwright.async_api import async_playwright
+from playwright.async_api import async_playwright, expect, TimeoutError as PlaywrightTimeoutError
 from playwright_stealth import Stealth  # stealth import
 from langgraph.graph import StateGraph
 import httpx
+import orjson
 import os
+import re
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = "gemini-pro"
+GEMINI_CACHE_DIR = ".gemini_cache"
+SELECTOR_CACHE_SIZE = 256
+SELECTOR_KEYS = ("username", "password", "submit")
+MAX_CONCURRENT_LOGINS = 10  # browser contexts open at once on the shared browser
+AUTH_STATE_DIR = ".auth_state"
+SESSION_PROBE_TIMEOUT = 30000  # ms to wait for either the login form or the app UI
+VALIDATE_MAX_BYTES = 256 * 1024  # enough of the page to find the login form
+LLM_HTML_MAX_CHARS = 32768
+HTML_SNAPSHOT_CHARS = 8192  # the UI only shows the head of the page
+# Role/text engines walk the whole DOM, so only plain CSS selectors are accepted from Gemini
+# Playwright treats "engine=..." (role=, text=, xpath=, internal:role=, ...) and a leading // or .. as non-CSS
+SELECTOR_ENGINE_PREFIX = re.compile(r"^[a-z][a-z0-9_:-]*=", re.I)
+NON_CSS_SELECTOR_PREFIXES = ("//", "..", ">>")
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+BROWSER_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--disable-web-security',
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--disable-background-networking',
+    '--disable-features=IsolateOrigins,site-per-process'
+]
+
+class Runtime:
+    # Owns a background event loop plus the Playwright browser and HTTP clients bound to it,
+    # so they survive across Streamlit reruns instead of being recreated per click.
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="runtime-loop", daemon=True).start()
+        self._playwright = None
+        self._browsers = {}  # keyed by headless flag
+        self._httpx = None
+        self._aiohttp = None
+        self._lock = asyncio.Lock()
+        self.login_slots = asyncio.BoundedSemaphore(MAX_CONCURRENT_LOGINS)
+        self.selector_cache = OrderedDict()
+        atexit.register(self.shutdown)
+
+    def run(self, coro):
+        # Blocks the calling (Streamlit script) thread until the coroutine finishes on the runtime loop
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def get_browser(self, headless=True):
+        async with self._lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+                # Patch browser launches/contexts once for the life of the driver
+                Stealth().hook_playwright_context(self._playwright)
+            browser = self._browsers.get(headless)
+            if browser is None or not browser.is_connected():
+                browser = await self._playwright.chromium.launch(headless=headless, args=BROWSER_ARGS)
+                self._browsers[headless] = browser
+            return browser
+
+    async def get_httpx(self):
+        if self._httpx is None:
+            self._httpx = httpx.AsyncClient(
+                http2=importlib.util.find_spec("h2") is not None,
+                timeout=5,
+                limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=30),
+            )
+        return self._httpx
+
+    async def get_aiohttp(self):
+        if self._aiohttp is None or self._aiohttp.closed:
+            self._aiohttp = aiohttp.ClientSession()
+        return self._aiohttp
+
+    async def close(self):
+        # Each step is best-effort so one failure (e.g. a crashed browser) can't leave the driver running
+        if self._httpx is not None:
+            with contextlib.suppress(Exception):
+                await self._httpx.aclose()
+            self._httpx = None
+        if self._aiohttp is not None:
+            with contextlib.suppress(Exception):
+                await self._aiohttp.close()
+            self._aiohttp = None
+        for browser in self._browsers.values():
+            if browser.is_connected():
+                with contextlib.suppress(Exception):
+                    await browser.close()
+        self._browsers.clear()
+        if self._playwright is not None:
+            with contextlib.suppress(Exception):
+                await self._playwright.stop()
+            self._playwright = None
+
+    def shutdown(self):
+        try:
+            asyncio.run_coroutine_threadsafe(self.close(), self.loop).result(timeout=10)
+        except Exception:
+            pass
+
+@st.cache_resource
+def get_runtime():
+    return Runtime()
+
+async def block_heavy_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+async def fast_fill(element, value):
+    # Set the value in one round trip instead of one simulated keystroke per character;
+    # the native setter keeps framework-controlled inputs (e.g. React) in sync
+    await element.evaluate(
+        """(e, v) => {
+            e.focus();
+            Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set.call(e, v);
+            e.dispatchEvent(new Event('input', {bubbles: true}));
+            e.dispatchEvent(new Event('change', {bubbles: true}));
+            e.blur();
+        }""",
+        value
+    )
+
+def storage_state_path(url, user_input):
+    digest = hashlib.sha1((url + user_input).encode("utf-8")).hexdigest()
+    return os.path.join(AUTH_STATE_DIR, f"{digest}.json")
+
+def write_private_file(path, data):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.chmod(path, 0o600)  # the mode above only applies when the file is first created
+
+async def save_storage_state(context_browser, path):
+    # Snapshot cookies and localStorage so the next run for this account can skip the form;
+    # these are live session credentials, so keep them readable by the owner only
+    os.makedirs(AUTH_STATE_DIR, mode=0o700, exist_ok=True)
+    state = await context_browser.storage_state()
+    await asyncio.to_thread(write_private_file, path, orjson.dumps(state))
+
+async def is_logged_in(page, form_selector):
+    if "mail.google.com" in page.url or "my.salesforce.com/one/one.app" in page.url:
+        return True
+    # Lightning renders the nav bar well after the load event, so wait for whichever
+    # of the login form or the app UI appears first and then check which one it was
+    try:
+        await page.locator(f"{form_selector}, div.oneAppNavBar").first.wait_for(
+            state="attached", timeout=SESSION_PROBE_TIMEOUT
+        )
+    except PlaywrightTimeoutError:
+        return False
+    return await page.locator("div.oneAppNavBar").count() > 0
+
+async def html_snapshot(page):
+    # Slice in the browser so a multi-MB post-login DOM never crosses CDP
+    return await page.evaluate(
+        "(limit) => document.documentElement.outerHTML.slice(0, limit)",
+        HTML_SNAPSHOT_CHARS
+    )
 
 def sanitize_url(url: str) -> str:
     if not url.startswith(("http://", "https://")):
         return "https://" + url
     return url
 
-async def gemini_suggest_selectors(html):
-    endpoint = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
+def minify_for_llm(html):
+    # Scripts, styles, SVG and comments are irrelevant for finding form selectors
+    html = re.sub(r"<script\b[^>]*>.*?</script>", "", html, flags=re.S | re.I)
+    html = re.sub(r"<style\b[^>]*>.*?</style>", "", html, flags=re.S | re.I)
+    html = re.sub(r"<svg\b[^>]*>.*?</svg>", "", html, flags=re.S | re.I)
+    html = re.sub(r"<!--.*?-->", "", html, flags=re.S)
+    html = re.sub(r"\s+", " ", html).strip()
+    return html[:LLM_HTML_MAX_CHARS]
+
+async def gemini_suggest_selectors(html, session):
+    endpoint = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
     prompt = {
         "contents": [{
             "parts": [{
-                "text": "Given this login page HTML, suggest probable CSS selectors for username, password, and submit button."
+                "text": (
+                    "Given this login page HTML, suggest probable CSS selectors for username, password, and submit button. "
+                    "Return only CSS selectors (id/class/attribute); do not use role=, text=, or :has-text pseudo-selectors. "
+                    'Reply with a single JSON object with the keys "username", "password" and "submit".'
+                )
             }, {
-                "text": html
+                "text": minify_for_llm(html)
             }]
         }]
     }
-    headers = {"Authorization": f"Bearer {GEMINI_API_KEY}", "Content-Type": "application/json"}
-    async with aiohttp.ClientSession() as session:
-        async with session.post(endpoint, json=prompt, headers=headers) as response:
-            content = await response.json()
-            for part in content.get("candidates", []):
-                selectors = part.get("content", {}).get("parts", [])
-                for selector in selectors:
-                    if "username" in selector or "password" in selector or "submit" in selector:
-                        return selector
+    headers = {"x-goog-api-key": GEMINI_API_KEY, "Content-Type": "application/json"}
+    async with session.post(endpoint, data=orjson.dumps(prompt), headers=headers) as response:
+        content = orjson.loads(await response.read())
+        for part in content.get("candidates", []):
+            selectors = part.get("content", {}).get("parts", [])
+            for selector in selectors:
+                parsed = parse_selector_reply(selector.get("text", ""))
+                if not parsed:
+                    continue
+                css_only = {key: value for key, value in parsed.items() if is_css_selector(value)}
+                if css_only:
+                    return css_only
     return None
 
+def is_css_selector(selector):
+    # Checked per comma-separated selector so attribute selectors like [role=textbox] still pass
+    for part in selector.split(","):
+        part = part.lstrip()
+        if part.startswith(NON_CSS_SELECTOR_PREFIXES) or SELECTOR_ENGINE_PREFIX.match(part):
+            return False
+        if ">>" in part or ":has-text(" in part:
+            return False
+    return True
+
+def is_selector_dict(data, required=SELECTOR_KEYS):
+    if not isinstance(data, dict) or not data or not set(data) <= set(SELECTOR_KEYS):
+        return False
+    if not all(key in data for key in required):
+        return False
+    return all(isinstance(value, str) and value.strip() for value in data.values())
+
+def parse_selector_reply(text):
+    # Gemini often wraps the JSON in prose or a code fence, so decode from each "{" in turn
+    # until one yields a selector object; trailing prose (even with braces) is ignored
+    decoder = json.JSONDecoder()
+    start = text.find("{")
+    while start != -1:
+        try:
+            data, _ = decoder.raw_decode(text, start)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            selectors = {key: data[key] for key in SELECTOR_KEYS if key in data}
+            if is_selector_dict(selectors):
+                return selectors
+        start = text.find("{", start + 1)
+    return None
+
+def selector_cache_key(html):
+    # Key on exactly what Gemini sees, so script/style/whitespace churn still hits the cache
+    digest = hashlib.sha256(minify_for_llm(html).encode("utf-8")).hexdigest()
+    return f"{GEMINI_MODEL}-{digest}"
+
+def read_selector_cache(path):
+    try:
+        with open(path, "rb") as f:
+            data = orjson.loads(f.read())
+    except (OSError, ValueError):
+        return None
+    # Entries may hold only the fields that passed the CSS filter, so no key is required;
+    # anything else (stale or hand-edited) is treated as a miss
+    return data if is_selector_dict(data, required=()) else None
+
+def write_selector_cache(path, selector):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(selector))
+
+async def fetch_selectors(runtime, key, html):
+    path = os.path.join(GEMINI_CACHE_DIR, f"{key}.json")
+    selector = await asyncio.to_thread(read_selector_cache, path)
+    if selector is not None:
+        return selector
+    session = await runtime.get_aiohttp()
+    selector = await gemini_suggest_selectors(html, session)
+    if selector is not None:
+        await asyncio.to_thread(write_selector_cache, path, selector)
+    return selector
+
+async def cached_suggest_selectors(runtime, html):
+    # In-process LRU of tasks, so concurrent lookups for one page share a single API call
+    key = selector_cache_key(html)
+    cache = runtime.selector_cache
+    task = cache.get(key)
+    if task is None:
+        task = asyncio.ensure_future(fetch_selectors(runtime, key, html))
+        cache[key] = task
+        if len(cache) > SELECTOR_CACHE_SIZE:
+            cache.popitem(last=False)
+    else:
+        cache.move_to_end(key)
+    try:
+        selector = await task
+    except Exception:
+        cache.pop(key, None)
+        raise
+    if selector is None:
+        cache.pop(key, None)
+    return selector
+
 class ValidateNode:
+    def __init__(self, runtime):
+        self.runtime = runtime
+
     async def run(self, context):
         url = context["url"]
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(url, timeout=5)
-                context["html"] = resp.text
-                context["status"] = "validated"
+            client = await self.runtime.get_httpx()
+            async with client.stream("GET", url) as resp:
+                buf = bytearray()
+                async for chunk in resp.aiter_bytes(chunk_size=32768):
+                    buf.extend(chunk)
+                    if len(buf) >= VALIDATE_MAX_BYTES:
+                        break
+                context["html"] = buf.decode(resp.charset_encoding or "utf-8", errors="replace")
+            context["selectors"] = await self.suggest_selectors(url, context["html"])
+            context["status"] = "validated"
         except Exception as e:
             context["error"] = str(e)
             context["status"] = "failed"
         return context
 
-class FindSelectorsNode:
-    async def run(self, context):
-        url = context.get("url", "")
-        if "accounts.google.com" in url:
-            context["selectors"] = {}
-        else:
-            context["selectors"] = {
-                "username": "#username",
-                "password": "#password",
-                "submit": "button[type='submit'], input[type='submit']"
-            }
-        context["status"] = "selectors_found"
-        return context
+    async def suggest_selectors(self, url, html):
+        selectors = find_selectors(url)
+        # Gmail has its own hard-coded flow; elsewhere prefer Gemini's guess when a key is configured
+        if not GEMINI_API_KEY or not selectors:
+            return selectors
+        try:
+            suggested = await cached_suggest_selectors(self.runtime, html)
+        except Exception:
+            suggested = None
+        # Any field Gemini didn't give a usable CSS selector for keeps the fixed default
+        return {**selectors, **(suggested or {})}
+
+def find_selectors(url):
+    # Plain lookup, so it runs inline in ValidateNode rather than as its own graph step
+    if "accounts.google.com" in url:
+        return {}
+    return {
+        "username": "#username",
+        "password": "#password",
+        "submit": "button[type='submit'], input[type='submit']"
+    }
 
 class LoginNode:
+    def __init__(self, runtime):
+        self.runtime = runtime
+
     async def run(self, context):
-        import asyncio  # ensure asyncio is imported here for sleep
         url = context["url"]
         user_input = context["user_input"]
         password = context["password"]
         selectors = context.get("selectors", {})
         logs = []
-        stealth = Stealth()
+        state_path = storage_state_path(sanitize_url(url), user_input)
+        restored = context.get("reuse_session") and os.path.exists(state_path)
         try:
-            async with stealth.use_async(async_playwright()) as p:
-                browser = await p.chromium.launch(
-                    headless=False,
-                    args=[
-                        '--disable-blink-features=AutomationControlled',
-                        '--disable-web-security',
-                        '--disable-features=IsolateOrigins,site-per-process'
-                    ]
-                )
+            browser = await self.runtime.get_browser(headless=not context.get("show_browser"))
+            # Each login gets its own isolated context; cap how many run at once
+            async with self.runtime.login_slots:
                 context_browser = await browser.new_context(
+                    storage_state=state_path if restored else None,
                     viewport={"width": 1280, "height": 720},
                     user_agent=(
                         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
@@ -93,135 +382,174 @@ class LoginNode:
                     timezone_id="America/New_York",
                     locale="en-US"
                 )
-                # Increase default timeouts
-                context_browser.set_default_navigation_timeout(150000)  # 2.5 minutes
-                context_browser.set_default_timeout(150000)
-
-                page = await context_browser.new_page()
-                page.set_default_timeout(150000)
-
-                clean_url = sanitize_url(url)
-                await page.goto(clean_url)
-                logs.append(f"Visited {clean_url}")
-
-                # Log console and other page errors to logs
-                page.on("console", lambda msg: logs.append(f"Console: {msg.text}"))
-                page.on("pageerror", lambda exc: logs.append(f"Page error: {exc.message}"))
-
-                if "accounts.google.com" in clean_url:
-                    await page.wait_for_selector('input[type="email"]', timeout=150000)
-                    await page.fill('input[type="email"]', user_input)
-                    await page.click('#identifierNext')
-                    logs.append("Filled email or username and clicked Next (Gmail step 1)")
-                    await page.wait_for_timeout(2000)
-                    await page.locator('input[type="password"]').wait_for(state='attached', timeout=150000)
-                    password_input = page.locator('input[type="password"]')
-                    await password_input.fill(password, timeout=150000)
-                    await page.click('#passwordNext')
-                    logs.append("Filled password and clicked Next (Gmail step 2)")
-                    await page.wait_for_load_state('networkidle', timeout=150000)
-                    logs.append("Gmail login completed, network idle detected")
-
-                    if "mail.google.com" in page.url:
-                        logs.append("Detected Gmail inbox page, ending login flow")
-                        context["final_url"] = page.url
-                        context["logs"] = logs
-
-                        screenshot_path = "screenshot.png"
-                        await page.screenshot(path=screenshot_path)
-                        context["screenshot"] = screenshot_path
-
-                        html_content = await page.content()
-                        context["html_content"] = html_content
-
-                        await browser.close()
-                        context["status"] = "login_attempted"
-                        return context
-
-                if selectors.get("username"):
-                    await page.wait_for_selector(selectors["username"], timeout=150000)
-                    await page.fill(selectors["username"], user_input)
-                    logs.append("Filled username or email")
-
-                    await page.wait_for_selector(selectors["password"], timeout=150000)
-                    await page.fill(selectors["password"], password)
-                    logs.append("Filled password")
-
-                    await page.wait_for_selector(selectors["submit"], timeout=150000)
-
-                    old_url = page.url
-                    await page.click(selectors["submit"])
-                    logs.append("Clicked submit button")
-
-                    # Poll URL change or wait for the Salesforce main app URL pattern
-                    for _ in range(60):
-                        await asyncio.sleep(2)
-                        current_url = page.url
-                        if current_url != old_url:
-                            logs.append(f"URL changed after login submit to {current_url}")
-                            # Wait for known Salesforce app URL pattern or UI element
-                            if "my.salesforce.com/one/one.app" in current_url:
-                                logs.append("Detected Salesforce main app URL pattern")
-                                break
-                        else:
-                            logs.append("URL not changed yet, continuing to poll")
-
-                    else:
-                        logs.append("URL did not change after login submit within timeout")
-
-                    # Wait for main Salesforce UI selector instead of networkidle
-                    try:
-                        await page.wait_for_selector("div.oneAppNavBar", timeout=90000)
-                        logs.append("Found main Salesforce app UI element")
-                    except Exception:
-                        logs.append("Did not find main Salesforce app UI element within timeout")
-
-                    await page.wait_for_timeout(8000)  # Allow UI stabilize
-                    logs.append("Waited additional 8s for UI stabilization")
-
-                screenshot_path = "screenshot.png"
-                await page.screenshot(path=screenshot_path)
-                html_content = await page.content()
-
-                context["final_url"] = page.url
-                context["screenshot"] = screenshot_path
-                context["html_content"] = html_content
-                context["logs"] = logs
-                await browser.close()
-                context["status"] = "login_attempted"
+                try:
+                    # Increase default timeouts
+                    context_browser.set_default_navigation_timeout(150000)  # 2.5 minutes
+                    context_browser.set_default_timeout(150000)
+
+                    page = await context_browser.new_page()
+                    page.set_default_timeout(150000)
+                    if context.get("block_resources"):
+                        # The login flow only needs the DOM, so skip images, fonts and media
+                        await page.route("**/*", block_heavy_resources)
+
+                    clean_url = sanitize_url(url)
+                    await page.goto(clean_url)
+                    logs.append(f"Visited {clean_url}")
+
+                    if context.get("debug"):
+                        # Log console and other page errors to logs; console output is throttled
+                        # because chatty SPAs can emit hundreds of messages per second
+                        last_console = [0.0]
+
+                        def on_console(msg):
+                            now = time.monotonic()
+                            if now - last_console[0] > 0.25:
+                                logs.append(f"Console: {msg.text}")
+                                last_console[0] = now
+
+                        page.on("console", on_console)
+                        page.on("pageerror", lambda exc: logs.append(f"Page error: {exc.message}"))
+
+                    form_selector = selectors.get("username") or 'input[type="email"]'
+                    logged_in = restored and await is_logged_in(page, form_selector)
+                    if logged_in:
+                        logs.append("Restored saved session, already logged in; login form skipped, credentials not tested")
+                        context["session_reused"] = True
+
+                    if not logged_in and "accounts.google.com" in clean_url:
+                        await page.wait_for_selector('input[type="email"]', timeout=150000)
+                        await page.fill('input[type="email"]', user_input)
+                        await page.click('#identifierNext')
+                        logs.append("Filled email or username and clicked Next (Gmail step 1)")
+                        password_input = page.locator('input[type="password"]')
+                        await password_input.wait_for(state='visible', timeout=150000)
+                        await password_input.fill(password, timeout=150000)
+                        await page.click('#passwordNext')
+                        logs.append("Filled password and clicked Next (Gmail step 2)")
+                        try:
+                            await expect(page).to_have_url(re.compile(r"mail\.google\.com"), timeout=150000)
+                            logs.append("Gmail login completed, inbox URL detected")
+                        except AssertionError:
+                            logs.append("Gmail inbox URL not reached within timeout")
+
+                        if "mail.google.com" in page.url:
+                            logs.append("Detected Gmail inbox page, ending login flow")
+                            if context.get("reuse_session"):
+                                await save_storage_state(context_browser, state_path)
+                            context["final_url"] = page.url
+                            context["logs"] = logs
+
+                            context["screenshot"] = await page.screenshot()
+
+                            if context.get("show_html"):
+                                context["html_content"] = await html_snapshot(page)
+
+                            context["status"] = "login_attempted"
+                            return context
+
+                    if not logged_in and selectors.get("username"):
+                        # Login form fields are usually present together, so wait for them concurrently
+                        username_el, password_el, submit_el = await asyncio.gather(
+                            page.wait_for_selector(selectors["username"], timeout=150000),
+                            page.wait_for_selector(selectors["password"], timeout=150000),
+                            page.wait_for_selector(selectors["submit"], timeout=150000),
+                        )
+                        await fast_fill(username_el, user_input)
+                        logs.append("Filled username or email")
+
+                        await fast_fill(password_el, password)
+                        logs.append("Filled password")
+
+                        old_url = page.url
+                        await submit_el.click()
+                        logs.append("Clicked submit button")
+
+                        # Wait for navigation to the Salesforce main app URL pattern
+                        try:
+                            await page.wait_for_url(
+                                lambda u: u != old_url and "my.salesforce.com/one/one.app" in u,
+                                timeout=120000
+                            )
+                            logs.append(f"URL changed after login submit to {page.url}")
+                            logs.append("Detected Salesforce main app URL pattern")
+                        except PlaywrightTimeoutError:
+                            if page.url != old_url:
+                                logs.append(f"URL changed after login submit to {page.url}")
+                            else:
+                                logs.append("URL did not change after login submit within timeout")
+
+                        # Wake as soon as the main Salesforce UI is visible instead of sleeping
+                        try:
+                            await expect(page.locator("div.oneAppNavBar")).to_be_visible(timeout=90000)
+                            logs.append("Found main Salesforce app UI element")
+                            if context.get("reuse_session"):
+                                await save_storage_state(context_browser, state_path)
+                        except AssertionError:
+                            logs.append("Did not find main Salesforce app UI element within timeout")
+
+                    screenshot_bytes = await page.screenshot()
+                    if context.get("show_html"):
+                        context["html_content"] = await html_snapshot(page)
+
+                    context["final_url"] = page.url
+                    context["screenshot"] = screenshot_bytes
+                    context["logs"] = logs
+                    context["status"] = "login_attempted"
+                finally:
+                    # Only the per-request context is torn down; the browser stays warm
+                    await context_browser.close()
 
         except Exception as e:
             logs.append(f"Exception: {str(e)}")
+            if restored:
+                # Don't let a stale saved session break every later run for this account
+                with contextlib.suppress(OSError):
+                    os.remove(state_path)
+                logs.append("Discarded saved session after failed run")
             context["error"] = str(e)
             context["logs"] = logs
             context["status"] = "login_failed"
 
         return context
 
-def build_graph():
+def build_graph(runtime):
     graph = StateGraph(dict)
-    graph.add_node("validate", ValidateNode().run)
-    graph.add_node("find_selectors", FindSelectorsNode().run)
-    graph.add_node("login", LoginNode().run)
+    graph.add_node("validate", ValidateNode(runtime).run)
+    graph.add_node("login", LoginNode(runtime).run)
     graph.add_node("fail", lambda ctx: ctx)
     graph.add_conditional_edges(
         "validate",
-        lambda ctx: "find_selectors" if ctx.get("status") == "validated" else "fail",
-        {"find_selectors": "find_selectors", "fail": "fail"},
-    )
-    graph.add_conditional_edges(
-        "find_selectors",
-        lambda ctx: "login" if ctx.get("status") == "selectors_found" else "fail",
+        lambda ctx: "login" if ctx.get("status") == "validated" else "fail",
         {"login": "login", "fail": "fail"},
     )
     graph.set_entry_point("validate")
     compiled = graph.compile()
     return compiled
 
-async def run_login_flow(context):
-    graph = build_graph()
-    returned_context = await graph.ainvoke(context)
-    return returned_context
+@st.cache_resource
+def get_graph():
+    # The compiled graph is stateless, so build it once rather than on every click or rerun
+    return build_graph(get_runtime())
+
+async def run_login_flow(graph, context):
+    return await graph.ainvoke(context)
+
+async def run_login_flows(graph, contexts):
+    return await asyncio.gather(*(run_login_flow(graph, context) for context in contexts))
+
+def parse_batch_logins(text):
+    # Only URL and username come from the text area; passwords are asked for in masked inputs
+    logins = []
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        fields = [field.strip() for field in line.split(",", 1)]
+        if len(fields) < 2 or not fields[0] or not fields[1]:
+            st.warning(f"Skipping batch line {line_number}: expected 'URL, username'")
+            continue
+        logins.append((sanitize_url(fields[0]), fields[1]))
+    return logins
 
 st.title("Async Automated Login Tester (AI-powered)")
 url = st.text_input("Login URL")
@@ -230,38 +558,64 @@ if url and not url.startswith(("http://", "https://")):
     url = "https://" + url
 user_input = st.text_input("Username or Email")
 password = st.text_input("Password", type="password")
+block_resources = st.checkbox("Block images/fonts for speed", value=True)
+show_browser = st.checkbox("Show browser window (debug)", value=False)
+debug = st.checkbox("Capture page console output (debug)", value=False)
+show_html = st.checkbox("Show page HTML", value=False)
+reuse_session = st.checkbox(
+    "Reuse saved session",
+    value=False,
+    help=(
+        "Saves the session after a successful login and, on later runs, skips the login form while it is "
+        "still valid, so the password is not checked. Sessions are stored under .auth_state/ only when this is on."
+    )
+)
+batch_text = st.text_area("Additional logins to run in parallel (one per line: URL, username)")
+batch_logins = [
+    (
+        login_url,
+        login_user,
+        # Key on the account as well as the index so a typed password never follows a different label
+        st.text_input(
+            f"Password for {login_user} at {login_url}",
+            type="password",
+            key=f"batch_password_{i}_{login_url}_{login_user}",
+        ),
+    )
+    for i, (login_url, login_user) in enumerate(parse_batch_logins(batch_text))
+]
 start_btn = st.button("Test Login")
 if start_btn:
-    input_context = {
-        "url": url,
-        "user_input": user_input,
-        "password": password,
+    options = {
+        "block_resources": block_resources,
+        "show_browser": show_browser,
+        "debug": debug,
+        "show_html": show_html,
+        "reuse_session": reuse_session,
     }
-    result = asyncio.run(run_login_flow(input_context))
+    logins = [(url, user_input, password)] if url or not batch_logins else []
+    logins += batch_logins
+    input_contexts = [
+        {"url": login_url, "user_input": login_user, "password": login_password, **options}
+        for login_url, login_user, login_password in logins
+    ]
+    results = get_runtime().run(run_login_flows(get_graph(), input_contexts))
 
-    # Write html content to file after async run finishes
-    if "html_content" in result:
-        try:
-            with open("page_content.html", "w", encoding="utf-8") as f:
-                f.write(result["html_content"])
-            result["html_file"] = "page_content.html"
-        except Exception as e:
-            st.error(f"Error writing HTML file: {e}")
-
-    st.write("## Final URL")
-    st.write(result.get("final_url", "Login failed"))
-    st.write("## Logs")
-    for log in result.get("logs", []):
-        st.write(log)
-    st.write("## Screenshot")
-    if result.get("screenshot"):
-        st.image(result["screenshot"])
-    st.write("## Page HTML")
-    if result.get("html_file"):
-        try:
-            with open(result["html_file"], "r", encoding="utf-8") as f:
-                st.code(f.read()[:1000] + "\n...")
-        except Exception as e:
-            st.error(f"Error reading HTML file: {e}")
-    if "error" in result:
-        st.error(result["error"])
+    for result in results:
+        if len(results) > 1:
+            st.write(f"# {result['url']}")
+        if result.get("session_reused"):
+            st.info("Login form skipped: a saved session was reused, so these credentials were not tested.")
+        st.write("## Final URL")
+        st.write(result.get("final_url", "Login failed"))
+        st.write("## Logs")
+        for log in result.get("logs", []):
+            st.write(log)
+        st.write("## Screenshot")
+        if result.get("screenshot"):
+            st.image(result["screenshot"])
+        if result.get("html_content"):
+            st.write("## Page HTML")
+            st.code(result["html_content"][:1000] + "\n...")
+        if "error" in result:
+            st.error(result["error"])